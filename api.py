@@ -1,25 +1,59 @@
-from flask import Flask, request, jsonify
-from src.chatbot import Chatbot
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+from src.batching import MicroBatcher
+from src.cache import LRUCache, make_cache_key
+from src.chatbot import Chatbot, ERROR_RESPONSE_PREFIX
+from src.export import ConversationExporter
+from src.json_provider import OrjsonProvider
 from src.sentiment import SentimentAnalyzer
-from src.summary import ConversationSummarizer
+from src.summary import ConversationSummarizer, AI_SUMMARY_ERROR_PREFIX
 from src.utils import load_environment_variables
+import orjson
 import os
+import tempfile
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+SENTIMENT_TIMEOUT_SECONDS = 30
+# PDFs larger than this spill from memory to a temporary file while being sent
+PDF_SPOOL_MAX_BYTES = 1024 * 1024
+RESPONSE_CACHE_SIZE = 1024
 
 # Initialize components
 load_environment_variables()
 chatbot = None
 sentiment_analyzer = None
+sentiment_batcher = None
 summarizer = None
+exporter = ConversationExporter()
+# Identical chat/summary requests are answered from memory instead of another LLM call
+chat_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+summary_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
 
+# The LLM and the sentiment models are initialized independently, so a missing
+# API key doesn't take the sentiment/emotion endpoints down with it
 try:
     chatbot = Chatbot()
-    sentiment_analyzer = SentimentAnalyzer()
     summarizer = ConversationSummarizer(chatbot)
-    print("All components initialized successfully")
+    print("Chatbot initialized successfully")
 except Exception as e:
-    print(f"Error initializing components: {str(e)}")
+    print(f"Error initializing chatbot: {str(e)}")
+
+try:
+    sentiment_analyzer = SentimentAnalyzer()
+    # Concurrent /api/sentiment requests share one batched forward pass
+    sentiment_batcher = MicroBatcher(sentiment_analyzer.analyze_all_statements,
+                                     max_batch_size=32, max_latency_ms=50)
+    print("Sentiment analyzer initialized successfully")
+except Exception as e:
+    print(f"Error initializing sentiment analyzer: {str(e)}")
+
+def _is_message_list(history) -> bool:
+    return isinstance(history, list) and all(isinstance(m, dict) for m in history)
+
+def _history_key(history) -> str:
+    # Only role and content reach the model, so extra fields (timestamps etc.) don't split the cache
+    return orjson.dumps([[m.get('role'), m.get('content')] for m in history]).decode('utf-8')
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -28,17 +62,56 @@ def chat():
     
     data = request.json
     user_message = data.get('message')
-    history = data.get('history', [])
+    history = data.get('history') or []
     
     if not user_message:
         return jsonify({'error': 'Message is required'}), 400
+    if not _is_message_list(history):
+        return jsonify({'error': 'History must be a list of messages'}), 400
         
+    session_id = data.get('session_id')
     try:
-        response = chatbot.get_response(user_message, history)
+        # Without history the reply continues the session's server-side chat, so it can't be reused
+        cache_key = make_cache_key(session_id or '', user_message, _history_key(history)) if history else None
+        cached = chat_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return jsonify({'response': cached})
+        
+        response = chatbot.get_response(user_message, history, session_id)
+        # Failed calls come back as apology text; don't pin them in the cache
+        if cache_key and not response.startswith(ERROR_RESPONSE_PREFIX):
+            chat_cache.set(cache_key, response)
         return jsonify({'response': response})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    if not chatbot:
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+
+    data = request.json
+    user_message = data.get('message')
+    history = data.get('history') or []
+    session_id = data.get('session_id')
+
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    if not _is_message_list(history):
+        return jsonify({'error': 'History must be a list of messages'}), 400
+
+    def generate():
+        try:
+            for chunk in chatbot.get_response_stream(user_message, history, session_id):
+                yield f"data: {app.json.dumps({'chunk': chunk})}\n\n"
+        except Exception as e:
+            # The status line is already sent, so failures end the stream with their own event
+            yield f"event: error\ndata: {app.json.dumps({'error': str(e)})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 @app.route('/api/sentiment', methods=['POST'])
 def analyze_sentiment():
     if not sentiment_analyzer:
@@ -49,13 +122,34 @@ def analyze_sentiment():
     
     if not text:
         return jsonify({'error': 'Text is required'}), 400
+    if not isinstance(text, str):
+        return jsonify({'error': 'Text must be a string'}), 400
         
     try:
-        result = sentiment_analyzer.analyze_statement(text)
+        result = sentiment_batcher.submit(text).result(timeout=SENTIMENT_TIMEOUT_SECONDS)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/sentiment/batch', methods=['POST'])
+def analyze_sentiment_batch():
+    if not sentiment_analyzer:
+        return jsonify({'error': 'Sentiment analyzer not initialized'}), 500
+
+    data = request.json
+    texts = data.get('texts')
+
+    if not texts or not isinstance(texts, list):
+        return jsonify({'error': 'Texts must be a non-empty list'}), 400
+    if not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': 'Texts must be strings'}), 400
+
+    try:
+        results = sentiment_analyzer.analyze_all_statements(texts)
+        return jsonify({'results': results})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/emotion', methods=['POST'])
 def analyze_emotion():
     if not sentiment_analyzer:
@@ -66,13 +160,34 @@ def analyze_emotion():
     
     if not text:
         return jsonify({'error': 'Text is required'}), 400
+    if not isinstance(text, str):
+        return jsonify({'error': 'Text must be a string'}), 400
         
     try:
-        result = sentiment_analyzer.analyze_emotion(text)
+        result = sentiment_analyzer.analyze_emotions_all_statements([text])[0]
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/emotion/batch', methods=['POST'])
+def analyze_emotion_batch():
+    if not sentiment_analyzer:
+        return jsonify({'error': 'Sentiment analyzer not initialized'}), 500
+
+    data = request.json
+    texts = data.get('texts')
+
+    if not texts or not isinstance(texts, list):
+        return jsonify({'error': 'Texts must be a non-empty list'}), 400
+    if not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': 'Texts must be strings'}), 400
+
+    try:
+        results = sentiment_analyzer.analyze_emotions_all_statements(texts)
+        return jsonify({'results': results})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/summary', methods=['POST'])
 def generate_summary():
     if not summarizer:
@@ -83,14 +198,53 @@ def generate_summary():
     
     if not history:
         return jsonify({'error': 'History is required'}), 400
+    if not _is_message_list(history):
+        return jsonify({'error': 'History must be a list of messages'}), 400
         
     try:
+        cache_key = make_cache_key(_history_key(history))
+        cached = summary_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({'summary': cached})
+        
         # Basic summary without sentiment/emotion results for simplicity in this API
         # In a real scenario, we might want to pass those if available or compute them
         summary = summarizer.generate_ai_summary(history)
+        if not summary.startswith(AI_SUMMARY_ERROR_PREFIX):
+            summary_cache.set(cache_key, summary)
         return jsonify({'summary': summary})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export/pdf', methods=['POST'])
+def export_pdf():
+    data = request.json
+    history = data.get('history')
+
+    if not history:
+        return jsonify({'error': 'History is required'}), 400
+    if not _is_message_list(history):
+        return jsonify({'error': 'History must be a list of messages'}), 400
+
+    # send_file closes the spool once the response is sent; on failure it is closed here
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+    try:
+        exporter.export_to_pdf(history, data.get('analysis'), data.get('sentiment_results'), fileobj=spool)
+        spool.seek(0)
+        return send_file(spool, mimetype='application/pdf', as_attachment=True,
+                         download_name='conversation_analysis.pdf')
+    except Exception as e:
+        spool.close()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    # The response caches are reported even when the sentiment model failed to load
+    return jsonify({
+        'sentiment_cache': sentiment_analyzer.get_cache_stats() if sentiment_analyzer else None,
+        'chat_cache': chat_cache.stats(),
+        'summary_cache': summary_cache.stats()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
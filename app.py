@@ -160,6 +160,10 @@ def main():
                     if st.button("Load", key="load_btn"):
                         try:
                             st.session_state.conversation = ConversationManager.load_from_file(session_options[selected])
+                            st.session_state.chatbot.set_rolling_summary(
+                                st.session_state.conversation.rolling_summary,
+                                st.session_state.conversation.summarized_count
+                            )
                             st.session_state.statement_sentiments = []
                             st.session_state.statement_emotions = []
                             st.session_state.sentiment_result = None
@@ -222,7 +226,7 @@ def main():
             button_text = "📊 Analyze Emotion" if st.session_state.analysis_mode == 'emotion' else "📊 Analyze Sentiment"
             if st.button(button_text, width='stretch', type="primary"):
                 with st.spinner("Analyzing conversation..."):
-                    user_messages_list = [msg['content'] for msg in st.session_state.conversation.get_history() if msg['role'] == 'user']
+                    user_messages_list = st.session_state.conversation.get_user_messages()
                     
                     if st.session_state.analysis_mode == 'emotion':
                         emotion_results = st.session_state.sentiment_analyzer.analyze_emotions_all_statements(user_messages_list)
@@ -275,7 +279,8 @@ def main():
         if st.session_state.conversation.is_empty():
             st.info("👋 Start a conversation by typing a message below!")
         else:
-            user_msg_index = 0
+            # Real-time badges are indexed over all user messages, including archived ones
+            user_msg_index = st.session_state.conversation.archived_user_count
             for msg in st.session_state.conversation.get_history():
                 if msg['role'] == 'user':
                     display_message_with_sentiment(msg['role'], msg['content'], user_msg_index)
@@ -301,10 +306,16 @@ def main():
                     st.session_state.statement_emotions.append(emotion)
             
             with st.spinner("Thinking..."):
+                # Evicting archived messages shifts what the rolling summary covers
+                conversation = st.session_state.conversation
+                if st.session_state.chatbot.get_rolling_summary()['summarized_count'] != conversation.summarized_count:
+                    st.session_state.chatbot.set_rolling_summary(conversation.rolling_summary,
+                                                                 conversation.summarized_count)
                 conversation_history = st.session_state.conversation.get_history()
                 bot_response = st.session_state.chatbot.get_response(user_input, conversation_history)
             
             st.session_state.conversation.add_message('assistant', bot_response)
+            st.session_state.conversation.set_rolling_summary(**st.session_state.chatbot.get_rolling_summary())
             st.session_state.sentiment_result = None
             
             st.rerun()
@@ -364,7 +375,7 @@ def main():
             # Statement-level results
             with st.expander("📋 Statement-Level Analysis"):
                 for i, (msg, sent, emo) in enumerate(zip(
-                    [m['content'] for m in st.session_state.conversation.get_history() if m['role'] == 'user'],
+                    st.session_state.conversation.get_user_messages(),
                     result['sentiment_results'],
                     result['emotion_results']
                 )):
@@ -412,7 +423,7 @@ def main():
             
             # Statement-level results
             with st.expander("📋 Statement-Level Analysis"):
-                user_messages = [m['content'] for m in st.session_state.conversation.get_history() if m['role'] == 'user']
+                user_messages = st.session_state.conversation.get_user_messages()
                 for i, (msg, sent) in enumerate(zip(user_messages, result['sentiment_results'])):
                     col1, col2 = st.columns([3, 1])
                     with col1:
@@ -517,7 +528,7 @@ def main():
             if st.button("📋 Export to JSON", width='stretch'):
                 try:
                     json_data = st.session_state.exporter.export_to_json(
-                        st.session_state.conversation.get_history(),
+                        st.session_state.conversation.to_dict()['history'],
                         result,
                         {
                             'session_id': st.session_state.conversation.session_id,
@@ -3,8 +3,9 @@ Sentiment threshold alert system.
 Monitors sentiment and triggers alerts when thresholds are crossed.
 """
 
+import time
 from typing import Dict, List, Optional, Callable
-from datetime import datetime
+from src.utils import format_timestamp
 
 
 class SentimentAlertManager:
@@ -20,7 +21,7 @@ class SentimentAlertManager:
         
         if sentiment_score < self.threshold:
             alert = {
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': time.time_ns(),
                 'score': sentiment_score,
                 'threshold': self.threshold,
                 'message': message,
@@ -29,10 +30,12 @@ class SentimentAlertManager:
             
             self.alert_history.append(alert)
             
+            # The raw time.time_ns() value stays in alert_history; callers get the ISO string
+            serialized = self._serialize_alert(alert)
             if self.alert_callback:
-                self.alert_callback(alert)
+                self.alert_callback(self._serialize_alert(alert))
             
-            return alert
+            return serialized
         
         return None
     
@@ -61,8 +64,11 @@ class SentimentAlertManager:
     def disable_alerts(self):
         self.alert_enabled = False
     
+    def _serialize_alert(self, alert: Dict[str, any]) -> Dict[str, any]:
+        return {**alert, 'timestamp': format_timestamp(alert['timestamp'])}
+    
     def get_alert_history(self) -> List[Dict[str, any]]:
-        return self.alert_history.copy()
+        return [self._serialize_alert(alert) for alert in self.alert_history]
     
     def clear_alerts(self):
         self.alert_history = []
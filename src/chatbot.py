@@ -2,44 +2,281 @@
 Chatbot module using Google Gemini API.
 """
 
+import random
+import threading
+import time
 import google.generativeai as genai
-from typing import List, Dict, Optional
-from src.utils import get_api_key
+from google.api_core import exceptions as google_exceptions
+from typing import Any, Iterator, List, Dict, Optional, Tuple
+from src.cache import LRUCache
+from src.utils import get_api_keys
+
+DEFAULT_SESSION = 'default'
+MODEL_NAME = 'gemini-2.0-flash'
+RETRYABLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)
+ERROR_RESPONSE_PREFIX = "I apologize, but I encountered an error."
+# After a failed summary call, wait for this many new messages before trying again
+SUMMARY_RETRY_MESSAGES = 10
+
+# genai.configure is process-wide, so the active key index is shared by every Chatbot instance
+_key_lock = threading.Lock()
+_key_index = 0
 
 
 class Chatbot:
-    def __init__(self, api_key: Optional[str] = None):
-        if api_key is None:
-            api_key = get_api_key('GEMINI_API_KEY')
+    def __init__(self, api_key: Optional[str] = None, max_sessions: int = 1024,
+                 max_history_messages: int = 20, max_retries: int = 6):
+        # Extra GEMINI_KEY_1..N keys are rotated through when a key hits its rate limit
+        self.api_keys = [api_key] if api_key else get_api_keys('GEMINI_API_KEY', 'GEMINI_KEY')
+        self.max_retries = max_retries
+        
+        with _key_lock:
+            genai.configure(api_key=self.api_keys[_key_index % len(self.api_keys)])
+            self.model = genai.GenerativeModel(MODEL_NAME)
+            self._model_key_index = _key_index
+        # Older turns beyond this window are folded into a rolling summary
+        self.max_history_messages = max_history_messages
+        # session_id -> chat plus a hash of the turns it already holds and its rolling summary
+        self._sessions = LRUCache(maxsize=max_sessions)
+    
+    def _new_session(self) -> Dict[str, Any]:
+        return {
+            'chat': None,
+            'history_hash': None,
+            'summary': '',
+            'summarized_count': 0,
+            'summary_hash': None,
+            'summary_retry_at': 0
+        }
+    
+    def _get_session(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        session_id = session_id or DEFAULT_SESSION
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._new_session()
+            self._sessions.set(session_id, session)
+        return session
+    
+    def start_conversation(self, session_id: Optional[str] = None):
+        session = self._new_session()
+        session['chat'] = self.model.start_chat(history=[])
+        session['history_hash'] = self._hash_history([])
+        self._sessions.set(session_id or DEFAULT_SESSION, session)
+    
+    def _hash_history(self, messages: List[Dict[str, str]]) -> int:
+        return hash(tuple((msg['role'], msg['content']) for msg in messages))
+    
+    def _prepare_chat(self, conversation_history: Optional[List[Dict[str, str]]] = None,
+                      session_id: Optional[str] = None):
+        self._sync_model()
+        session = self._get_session(session_id)
+        
+        # Callers that send no history rely on the context kept in the session's chat
+        if not conversation_history:
+            if session['chat'] is None:
+                self.start_conversation(session_id)
+                session = self._get_session(session_id)
+            return self._current_chat(session)
+        
+        prior = conversation_history[:-1]
+        self._validate_summary(session, prior)
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-        self.chat = None
+        # Reuse the existing chat when it already holds exactly the earlier turns
+        # and the window it sends to Gemini is still within bounds
+        history_hash = self._hash_history(prior)
+        window_size = len(prior) - session['summarized_count']
+        needs_summary = (window_size > 2 * self.max_history_messages
+                         and len(prior) >= session['summary_retry_at'])
+        if session['chat'] is not None and session['history_hash'] == history_hash and not needs_summary:
+            return self._current_chat(session)
+        
+        if needs_summary:
+            self._update_summary(session, prior)
+        
+        history = []
+        if session['summary']:
+            history.append({'role': 'user', 'parts': [f"Summary of our earlier conversation: {session['summary']}"]})
+            history.append({'role': 'model', 'parts': ["Understood, I'll keep that context in mind."]})
+        
+        for msg in prior[session['summarized_count']:]:
+            if msg['role'] == 'user':
+                history.append({'role': 'user', 'parts': [msg['content']]})
+            elif msg['role'] == 'assistant':
+                history.append({'role': 'model', 'parts': [msg['content']]})
+        
+        session['chat'] = self.model.start_chat(history=history)
+        session['history_hash'] = history_hash
+        return session['chat']
+    
+    def _current_chat(self, session: Dict[str, Any]):
+        # Chats created before a key rotation still point at the old model and its client
+        if session['chat'].model is not self.model:
+            session['chat'] = self.model.start_chat(history=session['chat'].history)
+        return session['chat']
+    
+    def _sync_model(self):
+        # Another instance may have rotated the shared key since this model was built
+        with _key_lock:
+            if self._model_key_index != _key_index:
+                self.model = genai.GenerativeModel(MODEL_NAME)
+                self._model_key_index = _key_index
+    
+    def _rotate_key(self, failed_key_index: int) -> bool:
+        global _key_index
+        with _key_lock:
+            if len(self.api_keys) < 2:
+                return False
+            # Another request (or Chatbot instance) may already have rotated away from the failed key
+            if _key_index == failed_key_index:
+                _key_index = (_key_index + 1) % len(self.api_keys)
+                genai.configure(api_key=self.api_keys[_key_index])
+            return True
+    
+    def _retry_delay(self, error: Exception, attempt: int, key_index: int) -> float:
+        if attempt == self.max_retries - 1:
+            raise error
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            self._rotate_key(key_index)
+        self._sync_model()
+        return random.uniform(0, 2 ** attempt)
+    
+    def _send_with_backoff(self, chat, message: str, **kwargs) -> Tuple[Any, Any]:
+        for attempt in range(self.max_retries):
+            key_index = _key_index
+            try:
+                return chat, chat.send_message(message, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                delay = self._retry_delay(e, attempt, key_index)
+                if chat.model is not self.model:
+                    chat = self.model.start_chat(history=chat.history)
+                time.sleep(delay)
     
-    def start_conversation(self):
-        self.chat = self.model.start_chat(history=[])
+    def _generate_with_backoff(self, prompt: str):
+        self._sync_model()
+        for attempt in range(self.max_retries):
+            key_index = _key_index
+            try:
+                return self.model.generate_content(prompt)
+            except RETRYABLE_ERRORS as e:
+                time.sleep(self._retry_delay(e, attempt, key_index))
     
-    def get_response(self, user_message: str, conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+    def generate(self, prompt: str) -> str:
+        # One-shot generation that doesn't touch any chat session
+        return self._generate_with_backoff(prompt).text
+    
+    def _validate_summary(self, session: Dict[str, Any], prior: List[Dict[str, str]]):
+        count = session['summarized_count']
+        if not count:
+            return
+        
+        # Drop the summary when the history it was built from no longer matches
+        prefix_hash = self._hash_history(prior[:count]) if count <= len(prior) else None
+        if prefix_hash is None or (session['summary_hash'] is not None and session['summary_hash'] != prefix_hash):
+            session['summary'] = ''
+            session['summarized_count'] = 0
+            session['summary_hash'] = None
+            session['summary_retry_at'] = 0
+            session['chat'] = None
+        else:
+            session['summary_hash'] = prefix_hash
+    
+    def _update_summary(self, session: Dict[str, Any], prior: List[Dict[str, str]]):
+        start = session['summarized_count']
+        end = len(prior) - self.max_history_messages
+        # Keep the window starting on a user turn so roles keep alternating
+        while end < len(prior) and prior[end]['role'] != 'user':
+            end += 1
+        if end <= start:
+            return
+        
+        conversation_text = "\n".join([
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in prior[start:end]
+        ])
+        prompt = f"""Update the running summary of a conversation with the new messages below.
+Keep it concise and preserve facts, user preferences, and open questions.
+
+Current summary:
+{session['summary'] or '(none)'}
+
+New messages:
+{conversation_text}
+
+Updated summary:"""
+        
         try:
-            if conversation_history and len(conversation_history) > 1:
-                history = []
-                for msg in conversation_history[:-1]:
-                    if msg['role'] == 'user':
-                        history.append({'role': 'user', 'parts': [msg['content']]})
-                    elif msg['role'] == 'assistant':
-                        history.append({'role': 'model', 'parts': [msg['content']]})
-                
-                self.chat = self.model.start_chat(history=history)
-            elif self.chat is None:
-                self.start_conversation()
-            
-            response = self.chat.send_message(user_message)
+            response = self._generate_with_backoff(prompt)
+            session['summary'] = response.text.strip()
+            session['summarized_count'] = end
+            session['summary_hash'] = self._hash_history(prior[:end])
+            session['summary_retry_at'] = 0
+        except Exception as e:
+            print(f"Warning: Failed to summarize conversation history: {str(e)}")
+            session['summary_retry_at'] = len(prior) + SUMMARY_RETRY_MESSAGES
+    
+    def _record_turn(self, chat, user_message: str, response_text: str,
+                     conversation_history: Optional[List[Dict[str, str]]] = None,
+                     session_id: Optional[str] = None):
+        session = self._get_session(session_id)
+        session['chat'] = chat
+        if not conversation_history:
+            session['history_hash'] = None
+        else:
+            session['history_hash'] = self._hash_history(list(conversation_history[:-1]) + [
+                {'role': 'user', 'content': user_message},
+                {'role': 'assistant', 'content': response_text}
+            ])
+    
+    def get_rolling_summary(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        session = self._get_session(session_id)
+        return {
+            'summary': session['summary'],
+            'summarized_count': session['summarized_count']
+        }
+    
+    def set_rolling_summary(self, summary: str, summarized_count: int, session_id: Optional[str] = None):
+        session = self._get_session(session_id)
+        session['summary'] = summary
+        session['summarized_count'] = summarized_count if summary else 0
+        session['summary_hash'] = None
+        session['summary_retry_at'] = 0
+        session['chat'] = None
+    
+    def get_response(self, user_message: str, conversation_history: Optional[List[Dict[str, str]]] = None,
+                     session_id: Optional[str] = None) -> str:
+        try:
+            chat = self._prepare_chat(conversation_history, session_id)
+            chat, response = self._send_with_backoff(chat, user_message)
+            self._record_turn(chat, user_message, response.text, conversation_history, session_id)
             return response.text
             
         except Exception as e:
             error_msg = f"Error generating response: {str(e)}"
-            return f"I apologize, but I encountered an error. {error_msg}. Please try again."
+            return f"{ERROR_RESPONSE_PREFIX} {error_msg}. Please try again."
     
-    def reset(self):
-        self.chat = None
-
+    def get_response_stream(self, user_message: str,
+                            conversation_history: Optional[List[Dict[str, str]]] = None,
+                            session_id: Optional[str] = None) -> Iterator[str]:
+        # Errors are raised rather than yielded as apology text, which would read as part of the reply
+        try:
+            chat = self._prepare_chat(conversation_history, session_id)
+            chat, stream = self._send_with_backoff(chat, user_message, stream=True)
+            chunks = []
+            for chunk in stream:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+            self._record_turn(chat, user_message, "".join(chunks), conversation_history, session_id)
+                    
+        except Exception:
+            # A stream that failed part-way leaves the ChatSession unusable, so the next turn starts a fresh one
+            session = self._get_session(session_id)
+            session['chat'] = None
+            session['history_hash'] = None
+            raise
+    
+    def reset(self, session_id: Optional[str] = None):
+        if session_id is None:
+            self._sessions.clear()
+        else:
+            self._sessions.pop(session_id)
@@ -3,59 +3,133 @@ Conversation history management module.
 Includes session management for saving/loading conversations.
 """
 
-from typing import List, Dict, Tuple, Optional
-import json
+from collections import deque
+from typing import Deque, List, Dict, Tuple, Optional
 import os
+import tempfile
+import threading
+import time
+import orjson
 from datetime import datetime
+from src.utils import format_timestamp
+
+MAX_HISTORY = 1000
+INDEX_FILE_NAME = 'index.jsonl'
+# Streamlit sessions run as threads in one process; saves must not interleave their index updates
+_INDEX_LOCK = threading.Lock()
 
 
 class ConversationManager:
-    def __init__(self, session_id: Optional[str] = None):
-        self.history: List[Dict[str, str]] = []
+    def __init__(self, session_id: Optional[str] = None, max_history: Optional[int] = MAX_HISTORY,
+                 archive_dir: str = 'saved_conversations'):
+        # Oldest messages are evicted to <archive_dir>/<session_id>/archive.jsonl once max_history is reached
+        self.history: Deque[Dict[str, str]] = deque(maxlen=max_history)
+        self.archive_dir = archive_dir
+        self.archived_count = 0
+        self.archived_user_count = 0
+        # Rolling summary of the earliest `summarized_count` messages, maintained by the chatbot
+        self.rolling_summary = ""
+        self.summarized_count = 0
+        # Derived views of the history, rebuilt lazily after the history changes
+        self._cached_format: Optional[str] = None
+        self._cached_user_msgs: Optional[List[str]] = None
+        self._cached_text: Optional[str] = None
         self.session_id = session_id or self._generate_session_id()
-        self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
+        self.created_at = time.time_ns()
+        self.updated_at = self.created_at
     
     def add_message(self, role: str, content: str):
         if role not in ['user', 'assistant']:
             raise ValueError("Role must be 'user' or 'assistant'")
         
-        self.history.append({
+        self._append({
             'role': role,
             'content': content,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': time.time_ns()
         })
-        self.updated_at = datetime.now().isoformat()
+        self.updated_at = time.time_ns()
+    
+    def _append(self, message: Dict[str, str]):
+        if self.history.maxlen is not None and len(self.history) == self.history.maxlen:
+            self._archive(self.history[0])
+        self.history.append(message)
+        self._invalidate_cache()
+    
+    def _invalidate_cache(self):
+        self._cached_format = None
+        self._cached_user_msgs = None
+        self._cached_text = None
+    
+    def _archive(self, message: Dict[str, str]):
+        archive_path = os.path.join(self.archive_dir, self.session_id)
+        os.makedirs(archive_path, exist_ok=True)
+        with open(os.path.join(archive_path, 'archive.jsonl'), 'ab') as f:
+            f.write(orjson.dumps(self._serialize_message(message), option=orjson.OPT_APPEND_NEWLINE))
+        
+        self.archived_count += 1
+        if message['role'] == 'user':
+            self.archived_user_count += 1
+        # The evicted message is the oldest one, so it was part of the summarized prefix
+        if self.summarized_count:
+            self.summarized_count -= 1
+    
+    def _serialize_message(self, message: Dict[str, str]) -> Dict[str, str]:
+        if 'timestamp' not in message:
+            return message
+        return {**message, 'timestamp': format_timestamp(message['timestamp'])}
     
     def get_history(self) -> List[Dict[str, str]]:
-        return self.history.copy()
+        return list(self.history)
     
     def format_for_sentiment(self) -> str:
         if not self.history:
             return ""
         
-        formatted_lines = []
-        for msg in self.history:
-            role_label = "User" if msg['role'] == 'user' else "Chatbot"
-            formatted_lines.append(f"{role_label}: {msg['content']}")
+        if self._cached_format is None:
+            formatted_lines = []
+            if self.archived_count:
+                formatted_lines.append(f"[{self.archived_count} earlier messages archived]")
+            for msg in self.history:
+                role_label = "User" if msg['role'] == 'user' else "Chatbot"
+                formatted_lines.append(f"{role_label}: {msg['content']}")
+            self._cached_format = "\n".join(formatted_lines)
         
-        return "\n".join(formatted_lines)
+        return self._cached_format
     
     def get_conversation_text(self) -> str:
-        user_messages = [msg['content'] for msg in self.history if msg['role'] == 'user']
-        return " ".join(user_messages)
+        if self._cached_text is None:
+            self._cached_text = " ".join(self._user_messages())
+        return self._cached_text
     
     def clear(self):
-        self.history = []
+        self.history.clear()
+        self.archived_count = 0
+        self.archived_user_count = 0
+        self.rolling_summary = ""
+        self.summarized_count = 0
+        self._invalidate_cache()
+        # A cleared conversation is a new session, so later evictions don't append to the old archive
+        self.session_id = self._next_session_id()
+        self.created_at = time.time_ns()
+        self.updated_at = self.created_at
+    
+    def set_rolling_summary(self, summary: str, summarized_count: int):
+        self.rolling_summary = summary
+        self.summarized_count = summarized_count
     
     def get_message_count(self) -> int:
         return len(self.history)
     
     def get_user_message_count(self) -> int:
-        return len([msg for msg in self.history if msg['role'] == 'user'])
+        return len(self._user_messages())
     
     def get_user_messages(self) -> List[str]:
-        return [msg['content'] for msg in self.history if msg['role'] == 'user']
+        return list(self._user_messages())
+    
+    def _user_messages(self) -> List[str]:
+        if self._cached_user_msgs is None:
+            self._cached_user_msgs = [msg['content'] for msg in self.history if msg['role'] == 'user']
+        return self._cached_user_msgs
     
     def is_empty(self) -> bool:
         return len(self.history) == 0
@@ -63,32 +137,89 @@ class ConversationManager:
     def _generate_session_id(self) -> str:
         return f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
+    def _next_session_id(self) -> str:
+        base = self._generate_session_id()
+        session_id = base
+        suffix = 1
+        while session_id == self.session_id or os.path.exists(os.path.join(self.archive_dir, session_id)):
+            session_id = f"{base}_{suffix}"
+            suffix += 1
+        return session_id
+    
     def save_to_file(self, filepath: Optional[str] = None) -> str:
         if filepath is None:
             os.makedirs('saved_conversations', exist_ok=True)
             filepath = f"saved_conversations/{self.session_id}.json"
         
-        data = {
-            'session_id': self.session_id,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'history': self.history
-        }
+        data = self.to_dict()
+        
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        self._update_index(os.path.dirname(filepath) or '.', {
+            'session_id': self.session_id,
+            'filepath': filepath,
+            'created_at': format_timestamp(self.created_at),
+            'updated_at': format_timestamp(self.updated_at),
+            'message_count': len(self.history)
+        })
         
         return filepath
     
+    @classmethod
+    def _read_index(cls, directory: str) -> Optional[List[Dict[str, str]]]:
+        index_path = os.path.join(directory, INDEX_FILE_NAME)
+        if not os.path.exists(index_path):
+            return None
+        
+        entries = []
+        with open(index_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    entries.append(orjson.loads(line))
+        return entries
+    
+    @classmethod
+    def _write_index(cls, directory: str, entries: List[Dict[str, str]]):
+        # Write to a temporary file and swap it in so readers never see a partial index
+        index_path = os.path.join(directory, INDEX_FILE_NAME)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{INDEX_FILE_NAME}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for entry in entries:
+                    f.write(orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE))
+            os.replace(tmp_path, index_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    
+    def _update_index(self, directory: str, entry: Dict[str, str]):
+        with _INDEX_LOCK:
+            entries = self._read_index(directory)
+            if entries is None:
+                # First save with an index: seed it from the session files already on disk
+                entries = self._scan_sessions(directory)
+            
+            entries = [e for e in entries if e['session_id'] != entry['session_id']]
+            entries.append(entry)
+            self._write_index(directory, entries)
+    
     @classmethod
     def load_from_file(cls, filepath: str) -> 'ConversationManager':
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(filepath, 'rb') as f:
+            data = orjson.loads(f.read())
         
-        manager = cls(session_id=data.get('session_id'))
-        manager.created_at = data.get('created_at', datetime.now().isoformat())
-        manager.updated_at = data.get('updated_at', datetime.now().isoformat())
-        manager.history = data.get('history', [])
+        history = data.get('history', [])
+        # Files saved before archiving existed may hold more than MAX_HISTORY messages; keep them
+        # all in memory rather than archiving (and writing to disk) while loading
+        manager = cls(session_id=data.get('session_id'), max_history=max(MAX_HISTORY, len(history)))
+        manager.created_at = data.get('created_at', time.time_ns())
+        manager.updated_at = data.get('updated_at', time.time_ns())
+        manager.archived_count = data.get('archived_count', 0)
+        manager.archived_user_count = data.get('archived_user_count', 0)
+        manager.rolling_summary = data.get('rolling_summary', "")
+        manager.summarized_count = data.get('summarized_count', 0)
+        manager.history.extend(history)
         
         return manager
     
@@ -97,13 +228,27 @@ class ConversationManager:
         if not os.path.exists(directory):
             return []
         
+        try:
+            sessions = cls._read_index(directory)
+        except Exception:
+            sessions = None
+        
+        if sessions is None:
+            sessions = cls._scan_sessions(directory)
+        else:
+            sessions = [s for s in sessions if os.path.exists(s['filepath'])]
+        
+        return sorted(sessions, key=lambda x: x['updated_at'], reverse=True)
+    
+    @classmethod
+    def _scan_sessions(cls, directory: str) -> List[Dict[str, str]]:
         sessions = []
         for filename in os.listdir(directory):
             if filename.endswith('.json'):
                 filepath = os.path.join(directory, filename)
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
+                    with open(filepath, 'rb') as f:
+                        data = orjson.loads(f.read())
                     sessions.append({
                         'session_id': data.get('session_id', filename),
                         'filepath': filepath,
@@ -114,13 +259,17 @@ class ConversationManager:
                 except Exception:
                     continue
         
-        return sorted(sessions, key=lambda x: x['updated_at'], reverse=True)
+        return sessions
     
     def to_dict(self) -> Dict:
         return {
             'session_id': self.session_id,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'history': self.history
+            'created_at': format_timestamp(self.created_at),
+            'updated_at': format_timestamp(self.updated_at),
+            'rolling_summary': self.rolling_summary,
+            'summarized_count': self.summarized_count,
+            'archived_count': self.archived_count,
+            'archived_user_count': self.archived_user_count,
+            'history': [self._serialize_message(msg) for msg in self.history]
         }
 
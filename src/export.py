@@ -3,17 +3,11 @@ Export functionality for conversations and analysis results.
 Supports PDF, CSV, and JSON formats.
 """
 
-import json
 import csv
 import io
+import orjson
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from typing import BinaryIO, Dict, List, Optional, Any
 
 
 class ConversationExporter:
@@ -32,7 +26,8 @@ class ConversationExporter:
             'analysis': analysis_results
         }
         
-        return json.dumps(export_data, indent=2, ensure_ascii=False)
+        return orjson.dumps(export_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                            | orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
     
     def export_to_csv(self, conversation_history: List[Dict[str, str]],
                      sentiment_results: Optional[List[Dict[str, Any]]] = None) -> str:
@@ -62,8 +57,18 @@ class ConversationExporter:
     
     def export_to_pdf(self, conversation_history: List[Dict[str, str]],
                      analysis_results: Optional[Dict[str, Any]] = None,
-                     sentiment_results: Optional[List[Dict[str, Any]]] = None) -> bytes:
-        buffer = io.BytesIO()
+                     sentiment_results: Optional[List[Dict[str, Any]]] = None,
+                     fileobj: Optional[BinaryIO] = None) -> Optional[bytes]:
+        # reportlab is only imported when a PDF is actually requested
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER
+
+        # With a fileobj the PDF is written straight into it and nothing is returned
+        buffer = fileobj if fileobj is not None else io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter,
                               rightMargin=72, leftMargin=72,
                               topMargin=72, bottomMargin=18)
@@ -149,6 +154,7 @@ class ConversationExporter:
         story.append(table)
         
         doc.build(story)
-        buffer.seek(0)
+        if fileobj is not None:
+            return None
         return buffer.getvalue()
 
@@ -3,55 +3,136 @@ Sentiment analysis module using Hugging Face transformers.
 Includes basic sentiment and multi-dimensional emotion analysis.
 """
 
+import os
+import threading
+from contextlib import nullcontext
+import numpy as np
 from typing import Dict, List, Tuple, Optional
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
+from src.cache import LRUCache, make_cache_key
+
+try:
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+except ImportError:
+    ORTModelForSequenceClassification = None
+
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sentiment_onnx')
+QUANTIZED_FILE_NAME = 'model_quantized.onnx'
 
 
 class SentimentAnalyzer:
     def __init__(self, model_name: str = "cardiffnlp/twitter-roberta-base-sentiment-latest", 
-                 emotion_model_name: str = "j-hartmann/emotion-english-distilroberta-base"):
+                 emotion_model_name: str = "j-hartmann/emotion-english-distilroberta-base",
+                 cache_size: int = 4096, quantize: bool = False, compile_models: bool = False,
+                 device: Optional[str] = None):
         self.model_name = model_name
         self.emotion_model_name = emotion_model_name
+        self.quantize = quantize
+        self.compile_models = compile_models
+        self.device = device or self._detect_device()
         self.tokenizer = None
         self.model = None
         self.emotion_tokenizer = None
         self.emotion_model = None
         self.labels = ['negative', 'neutral', 'positive']
         self.emotion_labels = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
+        # Results are keyed by model name and text, so switching models never serves stale entries
+        self._cache = LRUCache(maxsize=cache_size)
+        self._emotion_lock = threading.Lock()
+        self._emotion_load_attempted = False
         self._load_models()
     
     def _load_models(self):
         try:
             print(f"Loading sentiment model: {self.model_name}")
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
-            self.model.eval()
+            self.model = self._load_model(self.model_name)
             print("Sentiment model loaded successfully")
+            # Label arrays let batched results map argmax indices to labels with one NumPy lookup
+            self._labels_arr = np.array(self.labels)
+            self._emotion_labels_arr = np.array(self.emotion_labels)
         except Exception as e:
             raise RuntimeError(f"Failed to load sentiment model: {str(e)}")
+    
+    def _ensure_emotion_model(self) -> bool:
+        # The emotion model is only loaded once it is first needed; a failed load is not retried
+        if self._emotion_load_attempted:
+            return self.emotion_model is not None
         
-        try:
-            print(f"Loading emotion model: {self.emotion_model_name}")
-            self.emotion_tokenizer = AutoTokenizer.from_pretrained(self.emotion_model_name)
-            self.emotion_model = AutoModelForSequenceClassification.from_pretrained(self.emotion_model_name)
-            self.emotion_model.eval()
+        with self._emotion_lock:
+            if self._emotion_load_attempted:
+                return self.emotion_model is not None
             
             try:
-                if hasattr(self.emotion_model.config, 'id2label') and self.emotion_model.config.id2label:
-                    id2label = self.emotion_model.config.id2label
-                    self.emotion_labels = [id2label[i].lower() for i in sorted(id2label.keys())]
-                elif hasattr(self.emotion_model.config, 'label2id') and self.emotion_model.config.label2id:
-                    label2id = self.emotion_model.config.label2id
-                    self.emotion_labels = [label.lower() for label in sorted(label2id.keys(), key=lambda x: label2id[x])]
-            except Exception:
-                pass
-            
-            print(f"Emotion model loaded successfully with labels: {self.emotion_labels}")
-        except Exception as e:
-            print(f"Warning: Failed to load emotion model: {str(e)}")
-            self.emotion_tokenizer = None
-            self.emotion_model = None
+                print(f"Loading emotion model: {self.emotion_model_name}")
+                emotion_tokenizer = AutoTokenizer.from_pretrained(self.emotion_model_name)
+                emotion_model = self._load_model(self.emotion_model_name)
+                
+                try:
+                    if hasattr(emotion_model.config, 'id2label') and emotion_model.config.id2label:
+                        id2label = emotion_model.config.id2label
+                        self.emotion_labels = [id2label[i].lower() for i in sorted(id2label.keys())]
+                    elif hasattr(emotion_model.config, 'label2id') and emotion_model.config.label2id:
+                        label2id = emotion_model.config.label2id
+                        self.emotion_labels = [label.lower() for label in sorted(label2id.keys(), key=lambda x: label2id[x])]
+                except Exception:
+                    pass
+                
+                self._emotion_labels_arr = np.array(self.emotion_labels)
+                self.emotion_tokenizer = emotion_tokenizer
+                self.emotion_model = emotion_model
+                print(f"Emotion model loaded successfully with labels: {self.emotion_labels}")
+            except Exception as e:
+                print(f"Warning: Failed to load emotion model: {str(e)}")
+                self.emotion_tokenizer = None
+                self.emotion_model = None
+            finally:
+                self._emotion_load_attempted = True
+        
+        return self.emotion_model is not None
+    
+    def _detect_device(self) -> str:
+        if torch.cuda.is_available():
+            return 'cuda'
+        if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+            return 'mps'
+        return 'cpu'
+    
+    def _load_model(self, model_name: str):
+        if self.quantize:
+            try:
+                return self._load_quantized_model(model_name)
+            except Exception as e:
+                print(f"Warning: Falling back to PyTorch for {model_name}: {str(e)}")
+        
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        model.to(self.device)
+        
+        if self.compile_models:
+            try:
+                model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+            except Exception as e:
+                print(f"Warning: torch.compile unavailable, using eager mode: {str(e)}")
+        return model
+    
+    def _load_quantized_model(self, model_name: str):
+        if ORTModelForSequenceClassification is None:
+            raise RuntimeError("optimum[onnxruntime] is required for quantized inference")
+        
+        # Export and quantize once, then reuse the INT8 graph from the cache directory
+        save_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace('/', '--'))
+        if not os.path.exists(os.path.join(save_dir, QUANTIZED_FILE_NAME)):
+            print(f"Exporting {model_name} to ONNX with dynamic INT8 quantization")
+            onnx_model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+            onnx_model.save_pretrained(save_dir)
+            quantizer = ORTQuantizer.from_pretrained(onnx_model)
+            quantization_config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=save_dir, quantization_config=quantization_config)
+        
+        return ORTModelForSequenceClassification.from_pretrained(save_dir, file_name=QUANTIZED_FILE_NAME)
     
     def analyze(self, text: str) -> Dict[str, any]:
         if not text or not text.strip():
@@ -61,26 +142,113 @@ class SentimentAnalyzer:
                 'scores': {'negative': 0.33, 'neutral': 0.34, 'positive': 0.33}
             }
         
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512, padding=True)
+        return self._analyze_batch([text], self.tokenizer, self.model, self.model_name,
+                                   self._build_sentiment_results)[0]
+    
+    def _analyze_batch(self, texts: List[str], tokenizer, model, model_name: str, build_results,
+                       batch_size: int = 32, max_tokens_per_batch: Optional[int] = None) -> List[Dict[str, any]]:
+        results = [None] * len(texts)
         
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+        # Repeats within the batch share one forward pass
+        pending = {}
+        for i, text in enumerate(texts):
+            key = make_cache_key(model_name, text)
+            cached = self._cache.get(key)
+            if cached is None:
+                pending.setdefault(key, []).append(i)
+            else:
+                results[i] = cached
         
-        scores = predictions[0].tolist()
-        score_dict = {label: float(score) for label, score in zip(self.labels, scores)}
+        if pending:
+            unique_texts = [texts[indices[0]] for indices in pending.values()]
+            built = build_results(*self._predict(tokenizer, model, unique_texts, batch_size, max_tokens_per_batch))
+            for (key, indices), result in zip(pending.items(), built):
+                self._cache.set(key, result)
+                for i in indices:
+                    results[i] = result
         
-        max_idx = scores.index(max(scores))
-        label = self.labels[max_idx]
-        confidence = float(scores[max_idx])
-        sentiment_score = self._calculate_sentiment_score(label, confidence, score_dict)
+        # Hand out copies so callers can't mutate cached entries
+        return [{**result, 'scores': dict(result['scores'])} for result in results]
+    
+    def get_cache_stats(self) -> Dict[str, any]:
+        return self._cache.stats()
+    
+    def clear_cache(self):
+        self._cache.clear()
+    
+    def _predict(self, tokenizer, model, texts: List[str], batch_size: int = 32,
+                 max_tokens_per_batch: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Tokenize once without padding so each bucket is only padded to its own longest text
+        encodings = tokenizer(texts, truncation=True, max_length=512)
+        lengths = [len(ids) for ids in encodings['input_ids']]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
         
-        return {
-            'label': label,
-            'confidence': confidence,
-            'scores': score_dict,
-            'score': sentiment_score
-        }
+        # Quantized ONNX models always run on CPU, so follow the model's own device
+        device = getattr(model, 'device', torch.device('cpu'))
+        
+        positions, probabilities, top_indices, confidences = [], [], [], []
+        for bucket in self._make_buckets(order, lengths, batch_size, max_tokens_per_batch):
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in bucket]
+            inputs = {key: value.to(device) for key, value in tokenizer.pad(features, return_tensors="pt").items()}
+            
+            with torch.inference_mode(), self._autocast(device):
+                outputs = model(**inputs)
+                predictions = torch.nn.functional.softmax(outputs.logits.float(), dim=-1)
+                top_values, top_idx = predictions.max(dim=-1)
+            
+            positions.extend(bucket)
+            probabilities.append(predictions.cpu().numpy())
+            top_indices.append(top_idx.cpu().numpy())
+            confidences.append(top_values.cpu().numpy())
+        
+        # Undo the length sort so rows line up with the input texts
+        inverse = np.argsort(positions)
+        return (np.concatenate(probabilities)[inverse], np.concatenate(top_indices)[inverse],
+                np.concatenate(confidences)[inverse])
+    
+    def _autocast(self, device: torch.device):
+        # FP16 autocast only on CUDA; CPU and MPS run in full precision
+        if device.type == 'cuda':
+            return torch.autocast(device_type='cuda', dtype=torch.float16)
+        return nullcontext()
+    
+    def _make_buckets(self, order: List[int], lengths: List[int], batch_size: int,
+                      max_tokens_per_batch: Optional[int] = None) -> List[List[int]]:
+        # `order` is sorted by length, so the padded size of a bucket is the length of its last item
+        buckets = []
+        bucket = []
+        for i in order:
+            padded_tokens = (len(bucket) + 1) * lengths[i]
+            if bucket and (len(bucket) >= batch_size or
+                           (max_tokens_per_batch and padded_tokens > max_tokens_per_batch)):
+                buckets.append(bucket)
+                bucket = []
+            bucket.append(i)
+        if bucket:
+            buckets.append(bucket)
+        return buckets
+    
+    def _build_sentiment_results(self, probabilities: np.ndarray, top_indices: np.ndarray,
+                                 confidences: np.ndarray) -> List[Dict[str, any]]:
+        labels = self._labels_arr[top_indices].tolist()
+        results = []
+        for label, confidence, scores in zip(labels, confidences.tolist(), probabilities.tolist()):
+            score_dict = dict(zip(self.labels, scores))
+            results.append({
+                'label': label,
+                'confidence': confidence,
+                'scores': score_dict,
+                'score': self._calculate_sentiment_score(label, confidence, score_dict)
+            })
+        return results
+    
+    def _build_emotion_results(self, probabilities: np.ndarray, top_indices: np.ndarray,
+                               confidences: np.ndarray) -> List[Dict[str, any]]:
+        labels = self._emotion_labels_arr[top_indices].tolist()
+        return [
+            {'label': label, 'confidence': confidence, 'scores': dict(zip(self.emotion_labels, scores))}
+            for label, confidence, scores in zip(labels, confidences.tolist(), probabilities.tolist())
+        ]
     
     def analyze_conversation(self, conversation_text: str) -> Dict[str, any]:
         result = self.analyze(conversation_text)
@@ -145,15 +313,25 @@ class SentimentAnalyzer:
     def analyze_statement(self, text: str) -> Dict[str, any]:
         return self.analyze(text)
     
-    def analyze_all_statements(self, messages: List[str]) -> List[Dict[str, any]]:
-        results = []
-        for msg in messages:
-            result = self.analyze_statement(msg)
-            results.append(result)
+    def analyze_all_statements(self, messages: List[str], batch_size: int = 32,
+                               max_tokens_per_batch: Optional[int] = None) -> List[Dict[str, any]]:
+        results = [None] * len(messages)
+        indices = []
+        for i, msg in enumerate(messages):
+            if msg and msg.strip():
+                indices.append(i)
+            else:
+                results[i] = self.analyze(msg)
+        
+        analyzed = self._analyze_batch([messages[i] for i in indices], self.tokenizer, self.model,
+                                       self.model_name, self._build_sentiment_results,
+                                       batch_size, max_tokens_per_batch)
+        for i, result in zip(indices, analyzed):
+            results[i] = result
         return results
     
     def analyze_emotion(self, text: str) -> Dict[str, any]:
-        if not self.emotion_model or not self.emotion_tokenizer:
+        if not self._ensure_emotion_model():
             return {
                 'label': 'neutral',
                 'confidence': 0.0,
@@ -167,43 +345,36 @@ class SentimentAnalyzer:
                 'scores': {emotion: 0.14 for emotion in self.emotion_labels}
             }
         
-        inputs = self.emotion_tokenizer(text, return_tensors="pt", truncation=True, max_length=512, padding=True)
-        
-        with torch.no_grad():
-            outputs = self.emotion_model(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        
-        scores = predictions[0].tolist()
-        score_dict = {label: float(score) for label, score in zip(self.emotion_labels, scores)}
+        return self._analyze_batch([text], self.emotion_tokenizer, self.emotion_model,
+                                   self.emotion_model_name, self._build_emotion_results)[0]
+    
+    def analyze_emotions_all_statements(self, messages: List[str], batch_size: int = 32,
+                                        max_tokens_per_batch: Optional[int] = None) -> List[Dict[str, any]]:
+        if not self._ensure_emotion_model():
+            return [self.analyze_emotion(msg) for msg in messages]
         
-        max_idx = scores.index(max(scores))
-        label = self.emotion_labels[max_idx]
-        confidence = float(scores[max_idx])
+        results = [None] * len(messages)
+        indices = []
+        for i, msg in enumerate(messages):
+            if msg and msg.strip():
+                indices.append(i)
+            else:
+                results[i] = self.analyze_emotion(msg)
         
-        return {
-            'label': label,
-            'confidence': confidence,
-            'scores': score_dict
-        }
-    
-    def analyze_emotions_all_statements(self, messages: List[str]) -> List[Dict[str, any]]:
-        results = []
-        for msg in messages:
-            result = self.analyze_emotion(msg)
-            results.append(result)
+        analyzed = self._analyze_batch([messages[i] for i in indices], self.emotion_tokenizer,
+                                       self.emotion_model, self.emotion_model_name,
+                                       self._build_emotion_results, batch_size, max_tokens_per_batch)
+        for i, result in zip(indices, analyzed):
+            results[i] = result
         return results
     
     def get_emotion_summary(self, emotion_results: List[Dict[str, any]]) -> Dict[str, float]:
+        # Summary keys follow the emotion model's labels, so resolve them before aggregating
+        self._ensure_emotion_model()
+        
         if not emotion_results:
             return {emotion: 0.0 for emotion in self.emotion_labels}
         
-        # Aggregate scores
-        aggregated = {emotion: 0.0 for emotion in self.emotion_labels}
-        for result in emotion_results:
-            for emotion, score in result['scores'].items():
-                aggregated[emotion] += score
-        
-        # Average
-        count = len(emotion_results)
-        return {emotion: score / count for emotion, score in aggregated.items()}
-
+        scores = np.array([[result['scores'].get(emotion, 0.0) for emotion in self.emotion_labels]
+                           for result in emotion_results], dtype=np.float64)
+        return dict(zip(self.emotion_labels, scores.mean(axis=0).tolist()))
@@ -5,6 +5,8 @@ Conversation summary and mood trajectory analysis module.
 from typing import List, Dict, Optional
 from src.chatbot import Chatbot
 
+AI_SUMMARY_ERROR_PREFIX = "Error generating AI summary"
+
 
 class ConversationSummarizer:
     def __init__(self, chatbot: Optional[Chatbot] = None):
@@ -135,9 +137,9 @@ Output Format:
 ..."""
         
         try:
-            summary = self.chatbot.get_response(prompt, [])
+            summary = self.chatbot.generate(prompt)
             return summary
         except Exception as e:
-            return f"Error generating AI summary: {str(e)}. Using extractive summary instead."
+            return f"{AI_SUMMARY_ERROR_PREFIX}: {str(e)}. Using extractive summary instead."
 
 
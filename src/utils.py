@@ -3,6 +3,8 @@ Utility functions for the chatbot application.
 """
 
 import os
+from datetime import datetime
+from typing import List, Union
 from dotenv import load_dotenv
 
 
@@ -10,9 +12,27 @@ def load_environment_variables():
     load_dotenv()
 
 
-def get_api_key(key_name: str) -> str:
-    api_key = os.getenv(key_name)
-    if not api_key:
+def get_api_keys(key_name: str, numbered_prefix: str) -> List[str]:
+    # Collects key_name plus numbered_prefix_1..N, e.g. GEMINI_API_KEY, GEMINI_KEY_1, GEMINI_KEY_2
+    keys = []
+    if os.getenv(key_name):
+        keys.append(os.getenv(key_name))
+    
+    index = 1
+    while os.getenv(f"{numbered_prefix}_{index}"):
+        key = os.getenv(f"{numbered_prefix}_{index}")
+        if key not in keys:
+            keys.append(key)
+        index += 1
+    
+    if not keys:
         raise ValueError(f"{key_name} not found in environment variables. Please check your .env file.")
-    return api_key
+    return keys
 
+
+def format_timestamp(timestamp: Union[int, str]) -> str:
+    # Timestamps are stored as time.time_ns() integers and only formatted when serialized;
+    # values loaded from older files are already ISO strings
+    if isinstance(timestamp, int):
+        return datetime.fromtimestamp(timestamp / 1e9).isoformat()
+    return timestamp
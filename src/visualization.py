@@ -2,9 +2,13 @@
 Visualization module for sentiment and emotion analysis.
 """
 
+import numpy as np
 import plotly.graph_objects as go
 from typing import List, Dict, Optional
 
+_BASE_LAYOUT = dict(font=dict(size=12))
+_SENTIMENT_MAP = {'positive': 1, 'neutral': 0, 'negative': -1}
+
 
 def create_emotion_radar_chart(emotion_scores: Dict[str, float]) -> go.Figure:
     emotions = list(emotion_scores.keys())
@@ -28,7 +32,7 @@ def create_emotion_radar_chart(emotion_scores: Dict[str, float]) -> go.Figure:
             )),
         showlegend=True,
         title="Emotion Distribution Across Conversation",
-        font=dict(size=12)
+        **_BASE_LAYOUT
     )
     
     return fig
@@ -36,15 +40,15 @@ def create_emotion_radar_chart(emotion_scores: Dict[str, float]) -> go.Figure:
 
 def create_mood_trend_chart(sentiment_results: List[Dict[str, any]], 
                             emotion_results: Optional[List[Dict[str, any]]] = None) -> go.Figure:
-    message_indices = list(range(1, len(sentiment_results) + 1))
+    message_indices = np.arange(1, len(sentiment_results) + 1)
     
-    sentiment_map = {'positive': 1, 'neutral': 0, 'negative': -1}
-    sentiment_values = [sentiment_map.get(result['label'], 0) * result['confidence'] 
-                       for result in sentiment_results]
+    sentiment_values = (np.array([_SENTIMENT_MAP.get(result['label'], 0) for result in sentiment_results], dtype=float)
+                        * np.array([result['confidence'] for result in sentiment_results], dtype=float))
     
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
+    # WebGL traces stay responsive for long conversations where SVG scatter slows down
+    fig.add_trace(go.Scattergl(
         x=message_indices,
         y=sentiment_values,
         mode='lines+markers',
@@ -54,8 +58,8 @@ def create_mood_trend_chart(sentiment_results: List[Dict[str, any]],
     ))
     
     if emotion_results:
-        emotion_intensities = [result['confidence'] for result in emotion_results]
-        fig.add_trace(go.Scatter(
+        emotion_intensities = np.array([result['confidence'] for result in emotion_results], dtype=float)
+        fig.add_trace(go.Scattergl(
             x=message_indices,
             y=emotion_intensities,
             mode='lines+markers',
@@ -69,7 +73,7 @@ def create_mood_trend_chart(sentiment_results: List[Dict[str, any]],
         xaxis_title="Message Number",
         yaxis_title="Sentiment Score / Emotion Intensity",
         hovermode='x unified',
-        font=dict(size=12)
+        **_BASE_LAYOUT
     )
     
     return fig
@@ -96,7 +100,7 @@ def create_sentiment_distribution_chart(sentiment_results: List[Dict[str, any]])
         title="Sentiment Distribution",
         xaxis_title="Sentiment",
         yaxis_title="Count",
-        font=dict(size=12)
+        **_BASE_LAYOUT
     )
     
     return fig
@@ -0,0 +1,59 @@
+import threading
+import pytest
+from src.batching import MicroBatcher
+
+TIMEOUT_SECONDS = 5
+
+
+class RecordingBatchFn:
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def __call__(self, items):
+        with self._lock:
+            self.batches.append(list(items))
+        if self.fail_on is not None and self.fail_on in items:
+            raise ValueError(f"cannot process {self.fail_on}")
+        return [item * 10 for item in items]
+
+
+def test_flushes_when_batch_is_full():
+    batch_fn = RecordingBatchFn()
+    # The latency budget is far longer than the timeout, so only a full batch can flush in time
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_latency_ms=60_000)
+    futures = [batcher.submit(1), batcher.submit(2)]
+    assert [f.result(timeout=TIMEOUT_SECONDS) for f in futures] == [10, 20]
+    assert batch_fn.batches == [[1, 2]]
+
+
+def test_flushes_after_max_latency():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=100, max_latency_ms=20)
+    assert batcher.submit(3).result(timeout=TIMEOUT_SECONDS) == 30
+    assert batch_fn.batches == [[3]]
+
+
+def test_results_match_submission_order():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_latency_ms=20)
+    futures = [batcher.submit(i) for i in range(10)]
+    assert [f.result(timeout=TIMEOUT_SECONDS) for f in futures] == [i * 10 for i in range(10)]
+    assert all(len(batch) <= 4 for batch in batch_fn.batches)
+
+
+def test_propagates_exception():
+    batcher = MicroBatcher(RecordingBatchFn(fail_on=1), max_batch_size=1, max_latency_ms=20)
+    with pytest.raises(ValueError):
+        batcher.submit(1).result(timeout=TIMEOUT_SECONDS)
+
+
+def test_failing_item_does_not_fail_its_batch():
+    batch_fn = RecordingBatchFn(fail_on=2)
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_latency_ms=60_000)
+    good, bad = batcher.submit(1), batcher.submit(2)
+    assert good.result(timeout=TIMEOUT_SECONDS) == 10
+    with pytest.raises(ValueError):
+        bad.result(timeout=TIMEOUT_SECONDS)
+    assert batch_fn.batches == [[1, 2], [1], [2]]
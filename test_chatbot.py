@@ -0,0 +1,221 @@
+from types import SimpleNamespace
+from google.api_core import exceptions as google_exceptions
+import pytest
+import src.chatbot as chatbot_module
+from src.chatbot import Chatbot, ERROR_RESPONSE_PREFIX
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.initial_history = list(history)
+        self.history = list(history)
+
+    def send_message(self, message, **kwargs):
+        self.history.append({'role': 'user', 'parts': [message]})
+        self.history.append({'role': 'model', 'parts': [f"reply to {message}"]})
+        return FakeResponse(f"reply to {message}")
+
+
+class BrokenStreamChat(FakeChat):
+    # Like ChatSession after a stream dies part-way: every later send raises BrokenResponseError
+    def send_message(self, message, **kwargs):
+        if self.history and self.history[-1] == 'broken':
+            raise RuntimeError('BrokenResponseError')
+        self.history.append('broken')
+        return self._stream()
+
+    def _stream(self):
+        yield FakeResponse('partial')
+        raise RuntimeError('connection reset')
+
+
+class FakeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.chats = []
+        self.prompts = []
+        self.summary_error = None
+
+    def start_chat(self, history):
+        chat = FakeChat(self, history)
+        self.chats.append(chat)
+        return chat
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        if self.summary_error:
+            raise self.summary_error
+        return FakeResponse('summary text')
+
+
+class FakeGenai:
+    # Stands in for the process-wide google.generativeai module: models use the last configured key
+    def __init__(self):
+        self.configured = []
+        self.calls = []
+        self.failures = []
+
+    def configure(self, api_key):
+        self.configured.append(api_key)
+
+    def GenerativeModel(self, model_name):
+        return FlakyModel(model_name, self)
+
+
+class FlakyModel(FakeModel):
+    def __init__(self, model_name, genai):
+        super().__init__(model_name)
+        self.genai = genai
+        self.api_key = genai.configured[-1]
+
+    def generate_content(self, prompt):
+        self.genai.calls.append(self.api_key)
+        if self.genai.failures:
+            raise self.genai.failures.pop(0)
+        return FakeResponse('ok')
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    genai = FakeGenai()
+    monkeypatch.setattr(chatbot_module, 'genai', genai)
+    monkeypatch.setattr(chatbot_module, 'get_api_keys', lambda *names: ['key-0', 'key-1', 'key-2'])
+    monkeypatch.setattr(chatbot_module, '_key_index', 0)
+    monkeypatch.setattr(chatbot_module.time, 'sleep', lambda seconds: None)
+    return genai
+
+
+@pytest.fixture
+def chatbot(monkeypatch):
+    monkeypatch.setattr(chatbot_module, 'genai',
+                        SimpleNamespace(configure=lambda api_key: None, GenerativeModel=FakeModel))
+    # A window of 2 messages means the history is summarized once more than 4 earlier messages pile up
+    return Chatbot(api_key='test-key', max_history_messages=2)
+
+
+def _chat(chatbot, history, message):
+    # Mirrors app.py: the history passed in already ends with the new user message
+    history.append({'role': 'user', 'content': message})
+    reply = chatbot.get_response(message, history)
+    assert not reply.startswith(ERROR_RESPONSE_PREFIX)
+    history.append({'role': 'assistant', 'content': reply})
+    return reply
+
+
+def test_reuses_chat_when_history_matches(chatbot):
+    history = []
+    _chat(chatbot, history, 'message 0')
+    _chat(chatbot, history, 'message 1')
+    assert len(chatbot.model.chats) == 1
+
+
+def test_summarizes_when_window_exceeds_limit(chatbot):
+    history = []
+    for i in range(4):
+        _chat(chatbot, history, f"message {i}")
+
+    assert len(chatbot.model.prompts) == 1
+    assert chatbot.get_rolling_summary() == {'summary': 'summary text', 'summarized_count': 4}
+    # The rebuilt chat carries the summary pair followed by the two most recent messages
+    chat = chatbot.model.chats[-1]
+    assert 'summary text' in chat.initial_history[0]['parts'][0]
+    assert [m['parts'][0] for m in chat.initial_history[2:]] == [m['content'] for m in history[4:6]]
+
+
+def test_drops_summary_when_history_diverges(chatbot):
+    history = []
+    for i in range(4):
+        _chat(chatbot, history, f"message {i}")
+
+    diverged = [{'role': 'user', 'content': 'something else'}] + history[1:]
+    _chat(chatbot, diverged, 'message 4')
+
+    # The old summary no longer matches the prefix, so it is rebuilt from scratch
+    assert len(chatbot.model.prompts) == 2
+    assert '(none)' in chatbot.model.prompts[1]
+    assert 'something else' in chatbot.model.prompts[1]
+
+
+def test_resyncs_summary_after_eviction(chatbot):
+    history = []
+    for i in range(4):
+        _chat(chatbot, history, f"message {i}")
+
+    # The conversation evicted its two oldest messages and shifted the summarized count with them
+    history = history[2:]
+    chatbot.set_rolling_summary('summary text', 2)
+    _chat(chatbot, history, 'message 4')
+
+    assert len(chatbot.model.prompts) == 1
+    chat = chatbot.model.chats[-1]
+    assert 'summary text' in chat.initial_history[0]['parts'][0]
+    assert [m['parts'][0] for m in chat.initial_history[2:]] == [m['content'] for m in history[2:6]]
+
+
+def test_backs_off_after_failed_summary(chatbot):
+    chatbot.model.summary_error = RuntimeError('quota exceeded')
+    history = []
+    for i in range(4):
+        _chat(chatbot, history, f"message {i}")
+    chats = len(chatbot.model.chats)
+
+    _chat(chatbot, history, 'message 4')
+
+    # No new summary attempt and the existing chat is reused until more messages arrive
+    assert len(chatbot.model.prompts) == 1
+    assert len(chatbot.model.chats) == chats
+    assert chatbot.get_rolling_summary() == {'summary': '', 'summarized_count': 0}
+
+
+def test_failed_stream_starts_a_fresh_chat(chatbot):
+    chatbot.model.start_chat = lambda history: BrokenStreamChat(chatbot.model, history)
+    stream = chatbot.get_response_stream('hello', None, 's1')
+    assert next(stream) == 'partial'
+    with pytest.raises(RuntimeError):
+        next(stream)
+
+    del chatbot.model.start_chat
+    assert chatbot.get_response('hello again', None, 's1') == 'reply to hello again'
+
+
+def test_retries_transient_errors(fake_genai):
+    chatbot = Chatbot()
+    fake_genai.failures = [google_exceptions.ServiceUnavailable('busy')] * 2
+    assert chatbot.generate('hi') == 'ok'
+    assert fake_genai.calls == ['key-0'] * 3
+    assert fake_genai.configured == ['key-0']
+
+
+def test_rotates_key_on_resource_exhausted(fake_genai):
+    chatbot = Chatbot()
+    fake_genai.failures = [google_exceptions.ResourceExhausted('quota')]
+    assert chatbot.generate('hi') == 'ok'
+    assert fake_genai.calls == ['key-0', 'key-1']
+    assert chatbot_module._key_index == 1
+
+
+def test_reraises_on_last_attempt(fake_genai):
+    chatbot = Chatbot(max_retries=3)
+    fake_genai.failures = [google_exceptions.ServiceUnavailable('busy')] * 3
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        chatbot.generate('hi')
+    assert len(fake_genai.calls) == 3
+
+
+def test_rotation_is_shared_between_instances(fake_genai):
+    first, second = Chatbot(), Chatbot()
+    fake_genai.failures = [google_exceptions.ResourceExhausted('quota')]
+    first.generate('hi')
+
+    # The second instance picks up the rotated key and moves on from it instead of back to key-0
+    fake_genai.failures = [google_exceptions.ResourceExhausted('quota')]
+    second.generate('hi')
+    assert fake_genai.calls == ['key-0', 'key-1', 'key-1', 'key-2']
+    assert chatbot_module._key_index == 2
+
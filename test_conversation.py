@@ -0,0 +1,88 @@
+import os
+import threading
+import orjson
+import src.conversation as conversation_module
+from src.conversation import ConversationManager
+
+
+def _archive_lines(archive_dir, session_id):
+    path = archive_dir / session_id / 'archive.jsonl'
+    return path.read_bytes().splitlines() if path.exists() else []
+
+
+def test_clear_starts_a_new_archive(tmp_path):
+    manager = ConversationManager(session_id='first', max_history=2, archive_dir=str(tmp_path))
+    for i in range(3):
+        manager.add_message('user', f"message {i}")
+    assert len(_archive_lines(tmp_path, 'first')) == 1
+
+    manager.clear()
+    assert manager.session_id != 'first'
+    for i in range(3):
+        manager.add_message('user', f"new message {i}")
+
+    assert len(_archive_lines(tmp_path, 'first')) == 1
+    assert len(_archive_lines(tmp_path, manager.session_id)) == 1
+
+
+def test_load_does_not_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(conversation_module, 'MAX_HISTORY', 3)
+    filepath = tmp_path / 'old.json'
+    filepath.write_bytes(orjson.dumps({
+        'session_id': 'old',
+        'history': [{'role': 'user', 'content': f"message {i}"} for i in range(5)]
+    }))
+
+    ConversationManager.load_from_file(str(filepath))
+    manager = ConversationManager.load_from_file(str(filepath))
+
+    assert manager.get_message_count() == 5
+    assert manager.archived_count == 0
+    assert not (tmp_path / 'saved_conversations').exists()
+
+
+def _save(tmp_path, session_id, messages):
+    manager = ConversationManager(session_id=session_id, archive_dir=str(tmp_path))
+    for message in messages:
+        manager.add_message('user', message)
+    return manager.save_to_file(str(tmp_path / f"{session_id}.json"))
+
+
+def test_save_upserts_index_entry(tmp_path):
+    _save(tmp_path, 'a', ['hi'])
+    _save(tmp_path, 'b', ['hello'])
+    _save(tmp_path, 'a', ['hi', 'again'])
+
+    entries = ConversationManager._read_index(str(tmp_path))
+    assert sorted(e['session_id'] for e in entries) == ['a', 'b']
+    assert next(e for e in entries if e['session_id'] == 'a')['message_count'] == 2
+
+
+def test_list_falls_back_to_scan_without_index(tmp_path):
+    _save(tmp_path, 'a', ['hi'])
+    (tmp_path / 'index.jsonl').unlink()
+
+    sessions = ConversationManager.list_saved_sessions(str(tmp_path))
+    assert [s['session_id'] for s in sessions] == ['a']
+
+
+def test_list_skips_index_entries_for_deleted_files(tmp_path):
+    _save(tmp_path, 'a', ['hi'])
+    stale = _save(tmp_path, 'b', ['hello'])
+    os.remove(stale)
+
+    sessions = ConversationManager.list_saved_sessions(str(tmp_path))
+    assert [s['session_id'] for s in sessions] == ['a']
+
+
+def test_concurrent_saves_keep_every_entry(tmp_path):
+    threads = [threading.Thread(target=_save, args=(tmp_path, f"s{i}", ['hi'])) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    entries = ConversationManager._read_index(str(tmp_path))
+    assert sorted(e['session_id'] for e in entries) == sorted(f"s{i}" for i in range(20))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
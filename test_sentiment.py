@@ -0,0 +1,92 @@
+import pytest
+import torch
+from types import SimpleNamespace
+import src.sentiment as sentiment_module
+from src.sentiment import SentimentAnalyzer
+
+
+class StubTokenizer:
+    # One token per word, so a text's length is its word count
+    def __call__(self, texts, truncation=True, max_length=512):
+        input_ids = [[1] * len(text.split())[:max_length] for text in texts]
+        return {'input_ids': input_ids, 'attention_mask': [[1] * len(ids) for ids in input_ids]}
+
+    def pad(self, features, return_tensors="pt"):
+        width = max(len(feature['input_ids']) for feature in features)
+        return {key: torch.tensor([feature[key] + [0] * (width - len(feature[key])) for feature in features])
+                for key in ('input_ids', 'attention_mask')}
+
+
+class StubModel:
+    # Predicts class (word count % 3), which makes every row traceable back to its input text
+    def __init__(self):
+        self.device = torch.device('cpu')
+        self.batch_shapes = []
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+    def __call__(self, input_ids, attention_mask):
+        self.batch_shapes.append(tuple(input_ids.shape))
+        classes = attention_mask.sum(dim=-1) % 3
+        return SimpleNamespace(logits=torch.nn.functional.one_hot(classes, 3).float() * 5)
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    model = StubModel()
+    monkeypatch.setattr(sentiment_module, 'AutoTokenizer',
+                        SimpleNamespace(from_pretrained=lambda name: StubTokenizer()))
+    monkeypatch.setattr(sentiment_module, 'AutoModelForSequenceClassification',
+                        SimpleNamespace(from_pretrained=lambda name: model))
+    return SentimentAnalyzer(device='cpu')
+
+
+def _text(words):
+    return ' '.join(['word'] * words)
+
+
+def test_results_follow_input_order_across_lengths(analyzer):
+    word_counts = [5, 1, 3, 2, 4, 6, 1]
+    texts = [f"{_text(n - 1)} text{i}" for i, n in enumerate(word_counts)]
+    results = analyzer.analyze_all_statements(texts, batch_size=2)
+
+    assert [r['label'] for r in results] == [analyzer.labels[n % 3] for n in word_counts]
+    # Length-sorted buckets of at most two rows, each padded only to its own longest text
+    assert analyzer.model.batch_shapes == [(2, 1), (2, 3), (2, 5), (1, 6)]
+
+
+def test_predict_undoes_the_length_sort(analyzer):
+    texts = [_text(4), _text(1), _text(2)]
+    probabilities, top_indices, confidences = analyzer._predict(analyzer.tokenizer, analyzer.model, texts,
+                                                                batch_size=1)
+    assert top_indices.tolist() == [1, 1, 2]
+    assert probabilities.argmax(axis=-1).tolist() == [1, 1, 2]
+    assert confidences.tolist() == pytest.approx(probabilities.max(axis=-1).tolist())
+
+
+@pytest.mark.parametrize("lengths,batch_size,max_tokens,expected", [
+    ([4, 4, 4, 4, 4], 2, None, [[0, 1], [2, 3], [4]]),
+    ([2, 2, 3, 5], 32, 6, [[0, 1], [2], [3]]),
+    ([2, 2, 2], 32, 6, [[0, 1, 2]]),
+    # A text longer than the token budget still gets a bucket of its own
+    ([10], 32, 4, [[0]]),
+])
+def test_make_buckets(analyzer, lengths, batch_size, max_tokens, expected):
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    assert analyzer._make_buckets(order, lengths, batch_size, max_tokens) == expected
+
+
+def test_repeated_texts_run_once_then_hit_the_cache(analyzer):
+    texts = [_text(2), _text(3), _text(2)]
+    first = analyzer.analyze_all_statements(texts)
+    assert analyzer.model.batch_shapes == [(2, 3)]
+    assert first[0] == first[2]
+
+    second = analyzer.analyze_all_statements(texts)
+    assert analyzer.model.batch_shapes == [(2, 3)]
+    assert second == first
+    assert analyzer.get_cache_stats()['hits'] == 3